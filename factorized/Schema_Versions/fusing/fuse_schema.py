@@ -1,7 +1,47 @@
 import json
+import sys
 from datetime import datetime
 
-def fuse_schemas(main_schema_path, performance_schema_path, output_path):
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Map the "unmatched" property names of the performance data to our format
+PROPERTY_MAPPING = {
+    'correction': 'correction',
+    'standardized': 'standardized',
+    'filled_blank': 'filled_blank',
+    'improved_comment': 'improved_comment',
+    'missing_docs': 'missing_doc',
+    'contradictions': 'contradictions',
+    'questioned': 'questioned'
+}
+
+# Shared by every placeholder; only "description" is filled in per variable.
+# The nested "anyOf" list is shared by reference, which is fine as long as
+# placeholders are never mutated in place.
+PLACEHOLDER_TEMPLATE = {
+    "anyOf": [
+        {
+            "type": "string"
+        },
+        {
+            "type": "null"
+        }
+    ],
+    "default": None,
+    "description": None,
+    "group_id": "unknown",
+    "notes": "This variable was automatically created as a placeholder because it existed in performance data but not in the main schema. Please update with proper definition, type, and metadata."
+}
+
+def fuse_schemas(main_schema_path, performance_schema_path, output_path, pretty=False):
     """
     Fuse main schema with performance data schema
     
@@ -9,6 +49,7 @@ def fuse_schemas(main_schema_path, performance_schema_path, output_path):
         main_schema_path: Path to the main schema JSON with variable definitions
         performance_schema_path: Path to the performance data JSON
         output_path: Path where the fused schema will be saved
+        pretty: Indent the output for human reading instead of writing compact JSON
     """
     
     print("="*60)
@@ -18,8 +59,7 @@ def fuse_schemas(main_schema_path, performance_schema_path, output_path):
     # Read main schema
     print(f"\n1. Reading main schema from: {main_schema_path}")
     try:
-        with open(main_schema_path, 'r', encoding='utf-8') as f:
-            main_schema = json.load(f)
+        main_schema = load_json_file(main_schema_path)
         print(f"   ✓ Loaded main schema successfully")
     except FileNotFoundError:
         print(f"   ✗ ERROR: File not found - {main_schema_path}")
@@ -28,19 +68,6 @@ def fuse_schemas(main_schema_path, performance_schema_path, output_path):
         print(f"   ✗ ERROR: Invalid JSON in main schema - {e}")
         return False
     
-    # Read performance schema
-    print(f"\n2. Reading performance data from: {performance_schema_path}")
-    try:
-        with open(performance_schema_path, 'r', encoding='utf-8') as f:
-            performance_schema = json.load(f)
-        print(f"   ✓ Loaded performance data successfully")
-    except FileNotFoundError:
-        print(f"   ✗ ERROR: File not found - {performance_schema_path}")
-        return False
-    except json.JSONDecodeError as e:
-        print(f"   ✗ ERROR: Invalid JSON in performance schema - {e}")
-        return False
-    
     # Get properties from main schema
     if 'properties' in main_schema:
         properties = main_schema['properties']
@@ -48,105 +75,130 @@ def fuse_schemas(main_schema_path, performance_schema_path, output_path):
         properties = main_schema
         main_schema = {'properties': properties}
     
-    print(f"\n3. Processing schemas...")
-    print(f"   - Main schema variables: {len(properties)}")
-    print(f"   - Performance data variables: {len(performance_schema)}")
-    
     # Track statistics
     fused_count = 0
     created_count = 0
-    variables_with_performance = []
+    first_variable = None
     missing_variables = []
     
+    # One timestamp for the whole run, shared by every converted entry
+    timestamp = datetime.now().isoformat() + 'Z'
+    
+    # Read performance schema
+    print(f"\n2. Reading performance data from: {performance_schema_path}")
+    try:
+        performance_file = open(performance_schema_path, 'rb')
+    except FileNotFoundError:
+        print(f"   ✗ ERROR: File not found - {performance_schema_path}")
+        return False
+    
+    with performance_file:
+        print(f"   ✓ Opened performance data successfully")
+        
+        print(f"\n3. Processing schemas...")
+        print(f"   - Main schema variables: {len(properties)}")
+        
+        try:
+            converted_entries = read_performance_entries(performance_file, timestamp)
+        except json.JSONDecodeError as e:
+            print(f"   ✗ ERROR: Invalid JSON in performance schema - {e}")
+            return False
+    
     # Fuse the schemas
-    for var_name in performance_schema.keys():
-        if var_name in properties:
+    for var_name, converted_performance in converted_entries.items():
+        existing = properties.get(var_name)
+        if existing is not None:
             # Variable exists in main schema - just add performance data
-            if 'performance' in performance_schema[var_name]:
-                converted_performance = convert_performance_structure(
-                    performance_schema[var_name]['performance']
-                )
-                properties[var_name]['performance'] = converted_performance
+            if converted_performance is not None:
+                existing['performance'] = converted_performance
                 fused_count += 1
-                variables_with_performance.append(var_name)
+                if first_variable is None:
+                    first_variable = var_name
         else:
             # Variable missing from main schema - create placeholder
             missing_variables.append(var_name)
             placeholder = create_placeholder_variable(var_name)
             
-            if 'performance' in performance_schema[var_name]:
-                converted_performance = convert_performance_structure(
-                    performance_schema[var_name]['performance']
-                )
+            if converted_performance is not None:
                 placeholder['performance'] = converted_performance
             
             properties[var_name] = placeholder
             created_count += 1
-            variables_with_performance.append(var_name)
+            if first_variable is None:
+                first_variable = var_name
     
+    print(f"   - Performance data variables: {len(converted_entries)}")
     print(f"   ✓ Successfully fused {fused_count} existing variables")
     print(f"   ✓ Created {created_count} placeholder variables for missing entries")
     
     # Write fused schema
     print(f"\n4. Writing fused schema to: {output_path}")
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(main_schema, f, indent=2, ensure_ascii=False)
+        write_json_file(main_schema, output_path, pretty)
         print(f"   ✓ Fused schema saved successfully")
     except Exception as e:
         print(f"   ✗ ERROR: Could not write output file - {e}")
         return False
     
-    # Print summary
-    print("\n" + "="*60)
-    print("FUSION SUMMARY")
-    print("="*60)
-    print(f"Total variables in main schema: {len(properties)}")
-    print(f"  - Already existed: {fused_count}")
-    print(f"  - Created as placeholders: {created_count}")
-    print(f"Variables with performance data: {len(variables_with_performance)}")
-    print(f"Coverage: {(len(variables_with_performance)/len(properties)*100):.1f}%")
+    # Build the summary report and print it in one write
+    report = [
+        "\n" + "="*60,
+        "FUSION SUMMARY",
+        "="*60,
+        f"Total variables in main schema: {len(properties)}",
+        f"  - Already existed: {fused_count}",
+        f"  - Created as placeholders: {created_count}",
+    ]
+    # Every fused or created variable counts as having performance data
+    variables_with_performance = fused_count + created_count
+    report.append(f"Variables with performance data: {variables_with_performance}")
+    report.append(f"Coverage: {(variables_with_performance/len(properties)*100):.1f}%")
     
-    # Count patients
+    # Count patients from the first fused or created variable
     patients = set()
-    for var_name in variables_with_performance[:1]:  # Check first variable
-        if 'performance' in properties[var_name]:
-            patients = set(properties[var_name]['performance'].keys())
-            break
+    if first_variable is not None and 'performance' in properties[first_variable]:
+        patients = set(properties[first_variable]['performance'].keys())
     
     if patients:
-        print(f"Total patients: {len(patients)}")
-        print(f"Patient IDs: {', '.join(sorted(patients))}")
+        report.append(f"Total patients: {len(patients)}")
+        report.append(f"Patient IDs: {', '.join(sorted(patients))}")
     
     # Show missing variables details
     if missing_variables:
-        print("\n" + "="*60)
-        print("MISSING VARIABLES (Created as Placeholders)")
-        print("="*60)
-        print(f"\nThe following {len(missing_variables)} variables were NOT in the main schema")
-        print("and have been created with placeholder definitions:\n")
+        # Count how many patients have data for each missing variable
+        patient_counts = {
+            var_name: len(properties[var_name].get('performance', {}))
+            for var_name in missing_variables
+        }
+        # Sorted once, shared by the console listing and the file export
+        sorted_missing = sorted(missing_variables)
         
-        for i, var_name in enumerate(sorted(missing_variables), 1):
-            # Count how many patients have data for this variable
-            patient_count = 0
-            if 'performance' in properties[var_name]:
-                patient_count = len(properties[var_name]['performance'])
-            
-            print(f"{i:2d}. {var_name:40s} ({patient_count} patients)")
-        
-        print("\n" + "-"*60)
-        print("RECOMMENDATIONS:")
-        print("-"*60)
-        print("These placeholder variables have minimal definitions:")
-        print("  - anyOf: [string, null]")
-        print("  - description: 'Placeholder for [variable_name]'")
-        print("  - group_id: 'unknown'")
-        print("\nYou should update these variables with proper:")
-        print("  ✓ Data types (anyOf structure)")
-        print("  ✓ Descriptions")
-        print("  ✓ Group IDs")
-        print("  ✓ Options (if enum type)")
-        print("  ✓ Notes")
+        report.extend([
+            "\n" + "="*60,
+            "MISSING VARIABLES (Created as Placeholders)",
+            "="*60,
+            f"\nThe following {len(missing_variables)} variables were NOT in the main schema",
+            "and have been created with placeholder definitions:\n",
+        ])
+        report.extend(
+            f"{i:2d}. {var_name:40s} ({patient_counts[var_name]} patients)"
+            for i, var_name in enumerate(sorted_missing, 1)
+        )
+        report.extend([
+            "\n" + "-"*60,
+            "RECOMMENDATIONS:",
+            "-"*60,
+            "These placeholder variables have minimal definitions:",
+            "  - anyOf: [string, null]",
+            "  - description: 'Placeholder for [variable_name]'",
+            "  - group_id: 'unknown'",
+            "\nYou should update these variables with proper:",
+            "  ✓ Data types (anyOf structure)",
+            "  ✓ Descriptions",
+            "  ✓ Group IDs",
+            "  ✓ Options (if enum type)",
+            "  ✓ Notes",
+        ])
         
         # Export list of missing variables to a file
         missing_file = 'missing_variables.txt'
@@ -158,42 +210,169 @@ def fuse_schemas(main_schema_path, performance_schema_path, output_path):
                 f.write(f"Total missing variables: {len(missing_variables)}\n\n")
                 f.write("List of missing variables:\n")
                 f.write("-"*60 + "\n")
-                for var_name in sorted(missing_variables):
-                    patient_count = 0
-                    if 'performance' in properties[var_name]:
-                        patient_count = len(properties[var_name]['performance'])
-                    f.write(f"{var_name:40s} ({patient_count} patients)\n")
-            print(f"\n✓ Missing variables list saved to: {missing_file}")
+                lines = [
+                    f"{var_name:40s} ({patient_counts[var_name]} patients)"
+                    for var_name in sorted_missing
+                ]
+                f.write("\n".join(lines) + "\n")
+            report.append(f"\n✓ Missing variables list saved to: {missing_file}")
         except Exception as e:
-            print(f"\n⚠ Could not save missing variables list: {e}")
+            report.append(f"\n⚠ Could not save missing variables list: {e}")
     
-    print("\n" + "="*60)
-    print("\n✓ Fusion completed successfully!")
+    report.append("\n" + "="*60)
+    report.append("\n✓ Fusion completed successfully!")
+    sys.stdout.write("\n".join(report) + "\n")
     
     return True
 
 
-def create_placeholder_variable(var_name):
+class NonFiniteFloat(float):
     """
-    Create a placeholder variable definition for missing variables
+    NaN/Infinity read by the stdlib fallback in parse_json. orjson refuses
+    to encode float subclasses, so json_encoder hands these to the stdlib
+    encoder and they are written back as read instead of as null.
     """
-    return {
-        "anyOf": [
-            {
-                "type": "string"
-            },
-            {
-                "type": "null"
+
+
+def load_json_file(path):
+    """
+    Read a JSON file, using orjson when it is installed.
+    Invalid JSON raises json.JSONDecodeError whichever parser is used.
+    """
+    with open(path, 'rb') as f:
+        return parse_json(f.read())
+
+
+def parse_json(data):
+    """
+    Parse JSON bytes, using orjson when it is installed.
+    orjson rejects some input the stdlib accepts (NaN/Infinity, integers
+    beyond 64 bits), so documents it refuses are re-parsed with the stdlib.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data, parse_constant=NonFiniteFloat)
+    return json.loads(data)
+
+
+def read_performance_entries(f, timestamp):
+    """
+    Read an open binary performance file into {var_name: converted performance},
+    with None for variables that carry no performance data.
+    
+    With ijson installed the file is parsed incrementally and each variable
+    is converted as soon as it is read, so the raw document is never held
+    whole. Repeated keys keep their first position and last value, exactly
+    as with json.load. ijson's C backend rejects NaN/Infinity and integers
+    beyond 64 bits, which json.load accepts, so a file it refuses is re-read
+    with parse_json; invalid JSON then raises json.JSONDecodeError.
+    """
+    if ijson is not None:
+        try:
+            return {
+                var_name: convert_performance_entry(var_data, timestamp)
+                for var_name, var_data in ijson.kvitems(f, '', use_float=True)
             }
-        ],
-        "default": None,
-        "description": f"Placeholder for {var_name} - Please update with proper definition",
-        "group_id": "unknown",
-        "notes": "This variable was automatically created as a placeholder because it existed in performance data but not in the main schema. Please update with proper definition, type, and metadata."
+        except ijson.JSONError:
+            f.seek(0)
+    return {
+        var_name: convert_performance_entry(var_data, timestamp)
+        for var_name, var_data in parse_json(f.read()).items()
     }
 
 
-def convert_performance_structure(performance_data):
+def convert_performance_entry(var_data, timestamp):
+    """
+    Convert the "performance" data of one variable, or return None if it has none
+    """
+    performance = var_data.get('performance')
+    if performance is None:
+        return None
+    return convert_performance_structure(performance, timestamp)
+
+
+def write_json_file(data, path, pretty=False):
+    """
+    Write data as UTF-8 JSON, using orjson when it is installed.
+    Output is compact unless pretty is set, in which case it is indented by 2.
+    
+    The top-level "properties" object is encoded one variable at a time,
+    so only a single variable's JSON is held in memory at once.
+    """
+    encode = json_encoder(pretty)
+    with open(path, 'wb') as f:
+        write_json_object(f, data, encode, pretty)
+
+
+def json_encoder(pretty):
+    """
+    Return a function encoding one value to UTF-8 JSON bytes
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        stdlib_encode = stdlib_json_encoder(pretty)
+        
+        def encode(value):
+            try:
+                return orjson.dumps(value, option=option)
+            except orjson.JSONEncodeError:
+                # Integers beyond 64 bits or NaN/Infinity (NonFiniteFloat)
+                return stdlib_encode(value)
+        
+        return encode
+    return stdlib_json_encoder(pretty)
+
+
+def stdlib_json_encoder(pretty):
+    """
+    Return a function encoding one value to UTF-8 JSON bytes with json.dumps
+    """
+    if pretty:
+        return lambda value: json.dumps(value, indent=2, ensure_ascii=False).encode('utf-8')
+    return lambda value: json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def write_json_object(f, obj, encode, pretty, depth=0):
+    """
+    Write the dict obj to the binary file f entry by entry, producing the
+    same bytes as encoding it in one go. At the top level, "properties" is
+    itself written entry by entry.
+    """
+    if not obj:
+        f.write(b'{}')
+        return
+    
+    # Encoded JSON never contains a raw newline inside a string, so nested
+    # values can be re-indented by prefixing every line break.
+    newline = b'\n' + b'  ' * (depth + 1) if pretty else b''
+    key_separator = b': ' if pretty else b':'
+    
+    f.write(b'{')
+    for i, (key, value) in enumerate(obj.items()):
+        if i:
+            f.write(b',')
+        f.write(newline + encode(key) + key_separator)
+        if depth == 0 and key == 'properties' and isinstance(value, dict):
+            write_json_object(f, value, encode, pretty, depth + 1)
+        elif pretty:
+            f.write(encode(value).replace(b'\n', newline))
+        else:
+            f.write(encode(value))
+    f.write(b'\n' + b'  ' * depth + b'}' if pretty else b'}')
+
+
+def create_placeholder_variable(var_name):
+    """
+    Create a placeholder variable definition for missing variables
+    """
+    placeholder = PLACEHOLDER_TEMPLATE.copy()
+    placeholder["description"] = f"Placeholder for {var_name} - Please update with proper definition"
+    return placeholder
+
+
+def convert_performance_structure(performance_data, timestamp):
     """
     Convert performance data from the format:
     {
@@ -206,19 +385,20 @@ def convert_performance_structure(performance_data):
         "patient_D": { "match": true, "last_updated": "..." }
         "patient_E": { "correction": true, "last_updated": "..." }
     }
+    
+    timestamp is the ISO string stored as "last_updated" on every entry.
     """
     converted = {}
-    timestamp = datetime.now().isoformat() + 'Z'
     
     for patient_id, patient_data in performance_data.items():
         patient_performance = {}
         
         # Handle "matched" status
-        if 'matched' in patient_data and patient_data['matched']:
+        if patient_data.get('matched'):
             patient_performance['match'] = True
         
         # Handle "blank" status
-        elif 'blank' in patient_data and patient_data['blank']:
+        elif patient_data.get('blank'):
             # Blank means both human and MediXtract have no data
             # We'll mark this as pending or you can choose to skip it
             pass  # Skip blank entries or set pending: true
@@ -227,19 +407,9 @@ def convert_performance_structure(performance_data):
         elif 'unmatched' in patient_data:
             unmatched_data = patient_data['unmatched']
             
-            # Map the property names to our format
-            property_mapping = {
-                'correction': 'correction',
-                'standardized': 'standardized',
-                'filled_blank': 'filled_blank',
-                'improved_comment': 'improved_comment',
-                'missing_docs': 'missing_doc',
-                'contradictions': 'contradictions',
-                'questioned': 'questioned'
-            }
-            
-            for old_key, new_key in property_mapping.items():
-                if old_key in unmatched_data and unmatched_data[old_key]:
+            # Walk the mapping (not the source) so keys keep a stable order
+            for old_key, new_key in PROPERTY_MAPPING.items():
+                if unmatched_data.get(old_key):
                     patient_performance[new_key] = True
         
         # Only add to converted if there's actual performance data
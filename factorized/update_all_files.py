@@ -2,47 +2,76 @@
 """
 Flatten all files from the script's directory (recursively) into ./all_files.
 
-- Skips the ./all_files directory itself.
+- Skips the ./all_files directory itself (and the previous copy being deleted).
 - Replaces any previous contents of ./all_files.
 - Destination filenames include the source's relative folder path, e.g.
   "core⧵FilterBar.js" instead of just "FilterBar.js".
 - If duplicate filenames occur, appends " (1)", " (2)", ... before the extension.
 """
 
+import errno
 import os
 import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 
 # Choose how to encode folder separators inside the FLAT filename.
 # "⧵" (U+29F5) looks like a backslash but is a safe, legal character on major filesystems.
 # If you prefer ASCII, set to "__" or "--".
 SEPARATOR = "⧵"
 
-def ensure_clean_folder(folder: Path) -> None:
-    """Delete the folder if it exists, then recreate it."""
+# Errors meaning "this filesystem/kernel can't copy_file_range these files";
+# fast_copy falls back to shutil.copyfile when it sees one of them.
+COPY_FILE_RANGE_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP,
+}
+
+# Default filesystems on Windows and macOS are case-insensitive, so flat names
+# that differ only by case must not be handed out twice there.
+CASE_INSENSITIVE_FS = os.name == "nt" or sys.platform == "darwin"
+
+def ensure_clean_folder(folder: Path) -> Optional[Path]:
+    """
+    Move the folder aside if it exists, then recreate it empty.
+
+    Returns the moved-aside "<name>.old.<random>" sibling, which still has to
+    be deleted (and skipped while walking), or None if there was nothing to move.
+    """
+    stale = None
     if folder.exists():
-        shutil.rmtree(folder)
+        stale = Path(tempfile.mkdtemp(prefix=folder.name + ".old.", dir=folder.parent))
+        folder.rename(stale / folder.name)
     folder.mkdir(parents=True, exist_ok=True)
+    return stale
 
-def unique_destination_name(dst_dir: Path, filename: str) -> Path:
+def unique_destination_name(dst_dir: str, filename: str, allocated: set) -> str:
     """
     Return a unique destination path in dst_dir for filename.
     If a collision occurs, append ' (1)', ' (2)', ... before the extension.
+
+    allocated holds the names already handed out (casefolded where
+    CASE_INSENSITIVE_FS, exact otherwise). dst_dir is freshly emptied by
+    ensure_clean_folder, so no filesystem checks are needed.
     """
-    candidate = dst_dir / filename
-    if not candidate.exists():
-        return candidate
+    key = filename.casefold() if CASE_INSENSITIVE_FS else filename
+    if key not in allocated:
+        allocated.add(key)
+        return os.path.join(dst_dir, filename)
 
-    stem = candidate.stem
-    suffix = candidate.suffix
+    stem, suffix = os.path.splitext(filename)
     i = 1
     while True:
-        candidate = dst_dir / f"{stem} ({i}){suffix}"
-        if not candidate.exists():
-            return candidate
+        candidate = f"{stem} ({i}){suffix}"
+        key = candidate.casefold() if CASE_INSENSITIVE_FS else candidate
+        if key not in allocated:
+            allocated.add(key)
+            return os.path.join(dst_dir, candidate)
         i += 1
 
-def encoded_flat_name(base_dir: Path, src_path: Path) -> str:
+def encoded_flat_name(base_dir: str, src_path: str) -> str:
     """
     Encode the file's path relative to base_dir into a single flat filename,
     joining path components with SEPARATOR.
@@ -51,14 +80,14 @@ def encoded_flat_name(base_dir: Path, src_path: Path) -> str:
         base_dir / "core/FilterBar.js" -> "core⧵FilterBar.js"
         base_dir / "src/components/FilterBar.js" -> "src⧵components⧵FilterBar.js"
     """
-    rel = src_path.relative_to(base_dir)
+    rel = os.path.relpath(src_path, base_dir)
     # Join all parts (including the original filename) using the chosen separator.
-    parts = list(rel.parts)
-    flat = SEPARATOR.join(parts)
+    flat = rel.replace(os.sep, SEPARATOR)
 
     # Some OSes may still reject control characters; strip them just in case.
     # (Backslash '/' are not present anymore, we've replaced separators already.)
-    flat = "".join(ch for ch in flat if ch.isprintable())
+    if not flat.isprintable():
+        flat = "".join(ch for ch in flat if ch.isprintable())
 
     # Optional: cap very long names if your filesystem has tight limits.
     # if len(flat) > 240:
@@ -67,40 +96,120 @@ def encoded_flat_name(base_dir: Path, src_path: Path) -> str:
 
     return flat
 
-def copy_all_files_to_target(base_dir: Path, target_dir: Path) -> int:
+def copy_file_range_contents(src: str, dst: str) -> bool:
     """
-    Walk base_dir recursively, skipping target_dir, and copy every file found
-    into target_dir. Returns the number of files copied.
+    Copy the bytes of src into dst (created or truncated) entirely in-kernel
+    with os.copy_file_range. On copy-on-write and network filesystems this
+    can also share extents or copy server-side instead of moving the data.
+
+    Returns False, having copied nothing, if the first call copies 0 bytes:
+    some kernels and filesystems (procfs, sysfs, FUSE) do that for files that
+    are not empty, so the caller must copy those another way.
     """
-    files_copied = 0
-    target_name = target_dir.name
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            # Same chunk sizing as shutil's sendfile path; loop until EOF.
+            blocksize = min(max(os.fstat(src_fd).st_size, 2 ** 23), 2 ** 30)
+            if not os.copy_file_range(src_fd, dst_fd, blocksize):
+                return False
+            while os.copy_file_range(src_fd, dst_fd, blocksize):
+                pass
+            return True
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+def fast_copy(src: str, dst: str, is_regular_file: bool = True) -> None:
+    """
+    Copy src to dst together with its metadata, like shutil.copy2.
+    Uses os.copy_file_range where available (Linux), otherwise shutil.copyfile,
+    which already uses sendfile/fcopyfile on the platforms that have them.
+
+    Only regular files take the copy_file_range path: opening a named pipe
+    would block, whereas shutil.copyfile refuses it with SpecialFileError.
+    """
+    copied = False
+    if is_regular_file and hasattr(os, "copy_file_range"):
+        try:
+            copied = copy_file_range_contents(src, dst)
+        except OSError as e:
+            if e.errno not in COPY_FILE_RANGE_FALLBACK_ERRNOS:
+                raise
+    if not copied:
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+def iter_source_files(dir_path: str, skip_name: str, skip_paths: set):
+    """
+    Recursively yield os.DirEntry objects for every file under dir_path,
+    skipping any directory named skip_name and the directories in skip_paths.
+
+    Like os.walk, a directory's files are yielded before its subdirectories
+    are visited, and symlinks to directories are neither copied nor followed.
+    The DirEntry objects carry the type info from the directory read, so no
+    extra stat is needed per entry.
+    """
+    subdirs = []
+    try:
+        entries = os.scandir(dir_path)
+    except OSError:
+        return  # like os.walk, skip directories that can't be listed
+    with entries:
+        for entry in entries:
+            if entry.is_dir():
+                if (entry.name != skip_name
+                        and entry.path not in skip_paths
+                        and not entry.is_symlink()):
+                    subdirs.append(entry.path)
+            else:
+                yield entry
+
+    for subdir in subdirs:
+        yield from iter_source_files(subdir, skip_name, skip_paths)
+
+def copy_all_files_to_target(base_dir: Path, target_dir: Path, skip_dirs: list = ()) -> int:
+    """
+    Walk base_dir recursively, skipping target_dir and skip_dirs, and copy
+    every file found into target_dir. Returns the number of files copied.
 
-    for root, dirs, files in os.walk(base_dir):
-        # Prune the target_dir so we don't descend into it
-        if target_name in dirs:
-            dirs.remove(target_name)
+    Destination names are resolved sequentially, in walk order, so collision
+    numbering stays deterministic; only the copies themselves run in parallel.
+    """
+    copies = []
+    allocated = set()
+    target_name = target_dir.name
+    base_path = os.fspath(base_dir)
+    target_path = os.fspath(target_dir)
+    target_prefix = os.path.join(target_path, "")
+    skip_paths = {os.fspath(path) for path in skip_dirs}
 
-        for fname in files:
-            src_path = Path(root) / fname
+    # Directories named like target_dir are pruned so we don't descend into it
+    for entry in iter_source_files(base_path, target_name, skip_paths):
+        src_path = entry.path
 
-            # Skip if source is inside target_dir for any reason (extra safety)
-            try:
-                src_path.relative_to(target_dir)
-                continue  # inside target; skip
-            except ValueError:
-                pass
+        # Skip if source is inside target_dir for any reason (extra safety)
+        if src_path.startswith(target_prefix):
+            continue  # inside target; skip
 
-            # Build the encoded "flat" filename from the relative path
-            encoded_name = encoded_flat_name(base_dir, src_path)
+        # Build the encoded "flat" filename from the relative path
+        encoded_name = encoded_flat_name(base_path, src_path)
 
-            # Create a unique destination name to avoid collisions
-            dst_path = unique_destination_name(target_dir, encoded_name)
+        # Create a unique destination name to avoid collisions
+        dst_path = unique_destination_name(target_path, encoded_name, allocated)
+        # is_file() comes from the directory read, so this costs no stat
+        copies.append((src_path, dst_path, entry.is_file()))
 
-            # Copy with metadata
-            shutil.copy2(src_path, dst_path)
-            files_copied += 1
+    # Copy with metadata; the copies are I/O-bound and release the GIL
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results so any copy error is raised here
+        for _ in executor.map(lambda copy: fast_copy(*copy), copies):
+            pass
 
-    return files_copied
+    return len(copies)
 
 def main():
     base_dir = Path(__file__).resolve().parent
@@ -110,8 +219,15 @@ def main():
     print(f"Target directory: {target_dir}")
     print(f"Using separator: {SEPARATOR!r} in encoded filenames")
 
-    ensure_clean_folder(target_dir)
-    count = copy_all_files_to_target(base_dir, target_dir)
+    stale = ensure_clean_folder(target_dir)
+    if stale is None:
+        count = copy_all_files_to_target(base_dir, target_dir)
+    else:
+        # Delete the previous copy while the new one is being written
+        with ThreadPoolExecutor(max_workers=1) as cleanup:
+            removal = cleanup.submit(shutil.rmtree, stale)
+            count = copy_all_files_to_target(base_dir, target_dir, [stale])
+        removal.result()  # re-raise any error from the deletion
 
     print(f"Done. {count} files collected into '{target_dir.name}'.")
 